@@ -20,16 +20,20 @@ import math
 from werkzeug.wsgi import DispatcherMiddleware
 from werkzeug.serving import run_simple
 
+from middleware import CompressionMiddleware
+
 
 external_stylesheets = ["https://codepen.io/chriddyp/pen/bWLwgP.css",
                     "https://unpkg.com/purecss@1.0.0/build/pure-min.css"]
 server = Flask(__name__)
 dash_app1 = Dash(__name__, server = server,
         url_base_pathname='/gapminder_app/',
-        external_stylesheets=external_stylesheets)
+        external_stylesheets=external_stylesheets,
+        compress=False)
 dash_app2 = Dash(__name__, server = server,
         url_base_pathname='/tips_app/',
-        external_stylesheets=external_stylesheets)
+        external_stylesheets=external_stylesheets,
+        compress=False)
 
 
 # Dash app1, the gapminder table and graph
@@ -665,10 +669,29 @@ def render_reports():
     return redirect('/dash_tips')
 
 
-app = DispatcherMiddleware(server, {
+# Routes whose output is deterministic may be reused for a minute, which
+# lets CompressionMiddleware answer conditional requests without rendering.
+# /showLineChart and /showMultiChart draw random data, so they stay out.
+CACHEABLE_PATHS = {
+    '/', '/barandline', '/scatter_animation', '/gapminder',
+    '/gapminder_app/', '/gapminder_app/_dash-layout',
+    '/gapminder_app/_dash-dependencies',
+    '/tips_app/', '/tips_app/_dash-layout', '/tips_app/_dash-dependencies'
+}
+
+
+@server.after_request
+def add_cache_headers(response):
+    if (request.method == 'GET' and response.status_code == 200
+            and request.path in CACHEABLE_PATHS):
+        response.cache_control.max_age = 60
+    return response
+
+
+app = CompressionMiddleware(DispatcherMiddleware(server, {
     '/dash_gapminder': dash_app1.server,
     '/dash_tips': dash_app2.server
-})
+}))
 
 if __name__ == '__main__':
     run_simple('127.0.0.1', 8080, app, use_reloader=True, use_debugger=True)
@@ -0,0 +1,86 @@
+# Compare bytes and latency per route with and without CompressionMiddleware.
+# The 304 column times a conditional request; for routes in CACHEABLE_PATHS
+# it is answered from the middleware's cache without rendering the route.
+import sys
+import time
+from io import BytesIO
+
+from app import app
+
+ROUTES = ['/', '/showLineChart', '/showMultiChart', '/barandline',
+          '/gapminder', '/scatter_animation',
+          '/gapminder_app/', '/gapminder_app/_dash-layout',
+          '/gapminder_app/_dash-dependencies',
+          '/tips_app/', '/tips_app/_dash-layout']
+ROUNDS = 20
+
+
+def call(wsgi_app, path, headers=None):
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'SCRIPT_NAME': '',
+        'PATH_INFO': path,
+        'QUERY_STRING': '',
+        'SERVER_NAME': '127.0.0.1',
+        'SERVER_PORT': '8080',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': BytesIO(),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': False,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    environ.update(headers or {})
+    response = {}
+
+    def start_response(status, response_headers, exc_info=None):
+        response['status'] = status
+        response['headers'] = dict(response_headers)
+
+    start = time.perf_counter()
+    result = wsgi_app(environ, start_response)
+    body = b''.join(result)
+    if hasattr(result, 'close'):
+        result.close()
+    elapsed = time.perf_counter() - start
+    return response['status'], response['headers'], len(body), elapsed
+
+
+def measure(wsgi_app, path, headers=None):
+    timings = []
+    for _ in range(ROUNDS):
+        status, response_headers, size, elapsed = call(wsgi_app, path, headers)
+        timings.append(elapsed)
+    timings.sort()
+    return status, response_headers, size, timings[len(timings) // 2] * 1000
+
+
+def main():
+    plain = app.app
+    accept = {'HTTP_ACCEPT_ENCODING': 'br, gzip'}
+    print('%-34s %10s %10s %8s %10s %10s %10s' % (
+        'route', 'raw bytes', 'enc bytes', 'coding',
+        'raw ms', 'enc ms', '304 ms'))
+    for path in ROUTES:
+        _, _, raw_size, raw_ms = measure(plain, path)
+        status, headers, enc_size, enc_ms = measure(app, path, accept)
+        etag = headers.get('ETag')
+        if etag:
+            conditional = dict(accept, HTTP_IF_NONE_MATCH=etag)
+            cond_status, _, _, cond_ms = measure(app, path, conditional)
+            if cond_status.startswith('304'):
+                cond = '%10.2f' % cond_ms
+            else:
+                # The body changed between requests, e.g. random data
+                cond = '%10s' % 'changed'
+        else:
+            cond = '%10s' % '-'
+        print('%-34s %10d %10d %8s %10.2f %10.2f %s' % (
+            path, raw_size, enc_size, headers.get('Content-Encoding', '-'),
+            raw_ms, enc_ms, cond))
+
+
+if __name__ == '__main__':
+    main()
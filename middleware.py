@@ -0,0 +1,308 @@
+import gzip
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript',
+                      'application/xml', 'image/svg+xml')
+
+
+def _parse_accept_encoding(header):
+    # Returns {coding: q} for the Accept-Encoding request header
+    codings = {}
+    for item in header.split(','):
+        parts = item.strip().split(';')
+        coding = parts[0].strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in parts[1:]:
+            name, _, value = param.strip().partition('=')
+            if name.strip() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        codings[coding] = q
+    return codings
+
+
+def _etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    if etag.startswith('W/'):
+        etag = etag[2:]
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        # Compressed representations carry a "-<coding>" suffix on the tag
+        for coding in ('-gzip"', '-br"'):
+            if candidate.endswith(coding):
+                candidate = candidate[:-len(coding)] + '"'
+        if candidate == etag:
+            return True
+    return False
+
+
+def _cache_control(headers):
+    # Returns {directive: value} for the Cache-Control response header(s)
+    directives = {}
+    for name, value in headers:
+        if name.lower() != 'cache-control':
+            continue
+        for item in value.split(','):
+            directive, _, arg = item.strip().partition('=')
+            if directive:
+                directives[directive.strip().lower()] = arg.strip().strip('"')
+    return directives
+
+
+def _is_cacheable(headers):
+    if any(name.lower() == 'set-cookie' for name, _ in headers):
+        return False
+    directives = _cache_control(headers)
+    return not any(d in directives for d in ('no-store', 'no-cache', 'private'))
+
+
+def _varies_only_on_encoding(headers):
+    # Cache entries are keyed by URL, so any other Vary field rules them out
+    for name, value in headers:
+        if name.lower() != 'vary':
+            continue
+        for field in value.split(','):
+            if field.strip().lower() not in ('', 'accept-encoding'):
+                return False
+    return True
+
+
+def _fresh_for(headers):
+    # Seconds the response allowed itself to be reused, from max-age
+    try:
+        return max(int(_cache_control(headers).get('max-age', 0)), 0)
+    except ValueError:
+        return 0
+
+
+def _add_vary(headers, value):
+    for i, (name, existing) in enumerate(headers):
+        if name.lower() == 'vary':
+            tokens = [v.strip().lower() for v in existing.split(',')]
+            if value.lower() not in tokens and '*' not in tokens:
+                headers[i] = (name, '%s, %s' % (existing, value))
+            return
+    headers.append(('Vary', value))
+
+
+class _CachedEntry(object):
+
+    def __init__(self, etag, status, headers, body):
+        self.etag = etag
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.encoded = {}
+        self.fresh_for = _fresh_for(headers)
+        self.created = time.time()
+
+    @property
+    def size(self):
+        return len(self.body) + sum(len(v) for v in self.encoded.values())
+
+    def is_fresh(self):
+        return time.time() - self.created < self.fresh_for
+
+
+class CompressionMiddleware(object):
+    """WSGI middleware adding gzip/brotli compression, strong ETags and
+    304 responses for conditional GET/HEAD requests.
+
+    Successful GET responses get an ETag: the app's own if it sent one,
+    otherwise a hash of the body, suffixed with the content coding for
+    compressed representations. Responses without Set-Cookie, a no-store,
+    no-cache or private Cache-Control, or a Vary on anything but
+    Accept-Encoding are also kept in a small LRU cache keyed by URL and
+    bounded by ``cache_size`` entries and ``cache_bytes`` bytes; bodies
+    larger than ``max_entry_bytes`` are not stored. Compressed bodies are
+    stored on the entry and reused as long as the ETag is unchanged. A
+    conditional request matching an entry still within its
+    ``Cache-Control: max-age`` is answered with 304 without invoking the
+    wrapped app; otherwise the app runs and the 304 is decided from the
+    fresh response. HEAD requests run as GET so they return the same headers.
+    """
+
+    def __init__(self, app, min_size=500, compress_level=6, cache_size=128,
+                 cache_bytes=64 * 1024 * 1024, max_entry_bytes=8 * 1024 * 1024):
+        self.app = app
+        self.min_size = min_size
+        self.compress_level = compress_level
+        self.cache_size = cache_size
+        self.cache_bytes = cache_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __call__(self, environ, start_response):
+        method = environ.get('REQUEST_METHOD', 'GET')
+        key = self._cache_key(environ)
+
+        if method in ('GET', 'HEAD'):
+            entry = self._get_entry(key)
+            if (entry is not None and entry.is_fresh()
+                    and _etag_matches(environ.get('HTTP_IF_NONE_MATCH'),
+                                      entry.etag)):
+                return self._not_modified(entry, environ, start_response)
+
+        # Run HEAD as GET so it gets the same ETag, Vary and length headers
+        is_head = method == 'HEAD'
+        if is_head:
+            environ = dict(environ, REQUEST_METHOD='GET')
+
+        captured = {}
+
+        def capture_start_response(status, headers, exc_info=None):
+            captured['status'] = status
+            captured['headers'] = headers
+            captured['exc_info'] = exc_info
+            return captured.setdefault('written', []).append
+
+        result = self.app(environ, capture_start_response)
+        try:
+            body = b''.join(list(result))
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        body = b''.join(captured.get('written', [])) + body
+
+        status = captured['status']
+        header_names = set(k.lower() for k, _ in captured['headers'])
+        if not status.startswith('200') or 'content-encoding' in header_names:
+            start_response(status, captured['headers'], captured['exc_info'])
+            return [b''] if is_head else [body]
+
+        etag = None
+        headers = []
+        for name, value in captured['headers']:
+            if name.lower() == 'etag':
+                etag = value
+            elif name.lower() != 'content-length':
+                headers.append((name, value))
+
+        entry = None
+        if method in ('GET', 'HEAD'):
+            if etag is None:
+                etag = '"%s"' % hashlib.sha1(body).hexdigest()
+            entry = _CachedEntry(etag, status, list(headers), body)
+            cached = self._get_entry(key)
+            if cached is not None and cached.etag == etag:
+                entry.encoded = cached.encoded
+            if (_is_cacheable(headers) and _varies_only_on_encoding(headers)
+                    and len(body) <= self.max_entry_bytes):
+                self._set_entry(key, entry)
+            elif cached is not None:
+                self._drop_entry(key)
+            if _etag_matches(environ.get('HTTP_IF_NONE_MATCH'), etag):
+                return self._not_modified(entry, environ, start_response)
+
+        coding = self._choose_encoding(environ, headers, body)
+        if coding is not None:
+            if entry is not None:
+                encoded = entry.encoded.get(coding)
+                if encoded is None:
+                    encoded = self._compress(coding, body)
+                    self._add_encoded(entry, coding, encoded)
+            else:
+                encoded = self._compress(coding, body)
+            body = encoded
+            headers.append(('Content-Encoding', coding))
+        if entry is not None:
+            headers.append(('ETag', self._representation_etag(entry, coding)))
+        if self._is_compressible(headers):
+            _add_vary(headers, 'Accept-Encoding')
+
+        headers.append(('Content-Length', str(len(body))))
+        start_response(status, headers, captured['exc_info'])
+        return [b''] if is_head else [body]
+
+    def _cache_key(self, environ):
+        return (environ.get('SCRIPT_NAME', '') + environ.get('PATH_INFO', ''),
+                environ.get('QUERY_STRING', ''))
+
+    def _get_entry(self, key):
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                self._cache.move_to_end(key)
+            return entry
+
+    def _set_entry(self, key, entry):
+        with self._lock:
+            self._cache[key] = entry
+            self._cache.move_to_end(key)
+            self._evict()
+
+    def _drop_entry(self, key):
+        with self._lock:
+            self._cache.pop(key, None)
+
+    def _add_encoded(self, entry, coding, encoded):
+        with self._lock:
+            entry.encoded[coding] = encoded
+            self._evict()
+
+    def _evict(self):
+        # Called with the lock held; drops least recently used entries
+        total = sum(e.size for e in self._cache.values())
+        while self._cache and (len(self._cache) > self.cache_size
+                               or total > self.cache_bytes):
+            _, evicted = self._cache.popitem(last=False)
+            total -= evicted.size
+
+    def _representation_etag(self, entry, coding):
+        if coding is None:
+            return entry.etag
+        return '%s-%s"' % (entry.etag[:-1], coding)
+
+    def _not_modified(self, entry, environ, start_response):
+        coding = self._choose_encoding(environ, entry.headers, entry.body)
+        headers = [('ETag', self._representation_etag(entry, coding))]
+        headers.extend((k, v) for k, v in entry.headers
+                       if k.lower() in ('cache-control', 'expires', 'vary'))
+        if self._is_compressible(entry.headers):
+            _add_vary(headers, 'Accept-Encoding')
+        start_response('304 Not Modified', headers)
+        return [b'']
+
+    def _is_compressible(self, headers):
+        for name, value in headers:
+            if name.lower() == 'content-type':
+                return value.lower().startswith(COMPRESSIBLE_TYPES)
+        return False
+
+    def _choose_encoding(self, environ, headers, body):
+        if len(body) < self.min_size or not self._is_compressible(headers):
+            return None
+        accepted = _parse_accept_encoding(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        candidates = ['gzip']
+        if brotli is not None:
+            candidates.insert(0, 'br')
+        best, best_q = None, 0.0
+        for coding in candidates:
+            q = accepted.get(coding, accepted.get('*', 0.0))
+            if q > best_q:
+                best, best_q = coding, q
+        return best
+
+    def _compress(self, coding, body):
+        if coding == 'br':
+            return brotli.compress(body, quality=self.compress_level)
+        return gzip.compress(body, compresslevel=self.compress_level)
@@ -0,0 +1,247 @@
+import gzip
+import time
+
+import pytest
+
+import middleware
+from middleware import CompressionMiddleware
+
+
+BODY = b'<html>' + b'x' * 2000 + b'</html>'
+
+
+class StubApp(object):
+
+    def __init__(self, body=BODY, status='200 OK', headers=None):
+        self.body = body
+        self.status = status
+        self.headers = headers or [('Content-Type', 'text/html; charset=utf-8')]
+        self.calls = 0
+
+    def __call__(self, environ, start_response):
+        self.calls += 1
+        start_response(self.status, list(self.headers))
+        return [self.body]
+
+
+class FakeBrotli(object):
+
+    @staticmethod
+    def compress(body, quality=11):
+        return b'br:' + body
+
+
+def request(app, method='GET', path='/', **headers):
+    environ = {'REQUEST_METHOD': method, 'PATH_INFO': path}
+    environ.update(('HTTP_' + k.upper(), v) for k, v in headers.items())
+    response = {}
+
+    def start_response(status, response_headers, exc_info=None):
+        response['status'] = status
+        response['headers'] = response_headers
+
+    body = b''.join(app(environ, start_response))
+    return response['status'], response['headers'], body
+
+
+def header(headers, name):
+    values = [v for k, v in headers if k.lower() == name.lower()]
+    assert len(values) <= 1
+    return values[0] if values else None
+
+
+@pytest.fixture
+def no_brotli(monkeypatch):
+    monkeypatch.setattr(middleware, 'brotli', None)
+
+
+@pytest.fixture
+def fake_brotli(monkeypatch):
+    monkeypatch.setattr(middleware, 'brotli', FakeBrotli)
+
+
+def test_small_body_is_not_compressed(no_brotli):
+    app = CompressionMiddleware(StubApp(body=b'<p>hi</p>'))
+    _, headers, body = request(app, accept_encoding='gzip')
+    assert header(headers, 'Content-Encoding') is None
+    assert body == b'<p>hi</p>'
+
+
+def test_gzip_when_brotli_unavailable(no_brotli):
+    app = CompressionMiddleware(StubApp())
+    _, headers, body = request(app, accept_encoding='br, gzip')
+    assert header(headers, 'Content-Encoding') == 'gzip'
+    assert header(headers, 'Content-Length') == str(len(body))
+    assert gzip.decompress(body) == BODY
+
+
+def test_brotli_preferred_when_available(fake_brotli):
+    app = CompressionMiddleware(StubApp())
+    _, headers, body = request(app, accept_encoding='gzip, br')
+    assert header(headers, 'Content-Encoding') == 'br'
+    assert body == b'br:' + BODY
+
+
+def test_q_zero_refuses_coding(fake_brotli):
+    app = CompressionMiddleware(StubApp())
+    _, headers, _ = request(app, accept_encoding='br;q=0, gzip')
+    assert header(headers, 'Content-Encoding') == 'gzip'
+    _, headers, body = request(app, accept_encoding='gzip;q=0')
+    assert header(headers, 'Content-Encoding') is None
+    assert body == BODY
+
+
+def test_etag_carries_coding_suffix(no_brotli):
+    app = CompressionMiddleware(StubApp())
+    _, plain, _ = request(app)
+    _, gzipped, _ = request(app, accept_encoding='gzip')
+    assert header(gzipped, 'ETag') == header(plain, 'ETag')[:-1] + '-gzip"'
+
+
+def test_existing_vary_is_merged(no_brotli):
+    stub = StubApp(headers=[('Content-Type', 'text/html'), ('Vary', 'Cookie')])
+    app = CompressionMiddleware(stub)
+    _, headers, _ = request(app, accept_encoding='gzip')
+    assert header(headers, 'Vary') == 'Cookie, Accept-Encoding'
+
+
+def test_fresh_entry_answers_304_without_calling_app(no_brotli):
+    stub = StubApp(headers=[('Content-Type', 'text/html'),
+                            ('Cache-Control', 'max-age=60')])
+    app = CompressionMiddleware(stub)
+    _, headers, _ = request(app, accept_encoding='gzip')
+    etag = header(headers, 'ETag')
+    status, headers, body = request(app, accept_encoding='gzip',
+                                    if_none_match=etag)
+    assert status == '304 Not Modified'
+    assert header(headers, 'ETag') == etag
+    assert body == b''
+    assert stub.calls == 1
+
+
+def test_without_max_age_304_runs_app(no_brotli):
+    stub = StubApp()
+    app = CompressionMiddleware(stub)
+    _, headers, _ = request(app)
+    status, _, _ = request(app, if_none_match=header(headers, 'ETag'))
+    assert status == '304 Not Modified'
+    assert stub.calls == 2
+
+
+def test_unchanged_body_refreshes_entry(no_brotli, monkeypatch):
+    stub = StubApp(headers=[('Content-Type', 'text/html'),
+                            ('Cache-Control', 'max-age=10')])
+    app = CompressionMiddleware(stub)
+    now = [1000.0]
+    monkeypatch.setattr(time, 'time', lambda: now[0])
+    _, headers, _ = request(app)
+    etag = header(headers, 'ETag')
+    now[0] += 20
+    request(app)
+    now[0] += 5
+    status, _, _ = request(app, if_none_match=etag)
+    assert status == '304 Not Modified'
+    assert stub.calls == 2
+
+
+@pytest.mark.parametrize('extra', [('Cache-Control', 'no-store'),
+                                   ('Cache-Control', 'private, max-age=60'),
+                                   ('Set-Cookie', 'session=1'),
+                                   ('Vary', 'Cookie')])
+def test_uncacheable_response_is_revalidated_by_app(no_brotli, extra):
+    stub = StubApp(headers=[('Content-Type', 'text/html'),
+                            ('Cache-Control', 'max-age=60'), extra])
+    app = CompressionMiddleware(stub)
+    _, headers, body = request(app, accept_encoding='gzip')
+    etag = header(headers, 'ETag')
+    assert etag.endswith('-gzip"')
+    assert gzip.decompress(body) == BODY
+    assert not app._cache
+    status, _, _ = request(app, accept_encoding='gzip', if_none_match=etag)
+    assert status == '304 Not Modified'
+    assert stub.calls == 2
+
+
+def test_upstream_etag_is_kept(no_brotli):
+    stub = StubApp(headers=[('Content-Type', 'text/html'),
+                            ('Cache-Control', 'no-cache'), ('ETag', '"abc"')])
+    app = CompressionMiddleware(stub)
+    _, headers, _ = request(app)
+    assert header(headers, 'ETag') == '"abc"'
+    _, headers, _ = request(app, accept_encoding='gzip')
+    assert header(headers, 'ETag') == '"abc-gzip"'
+    status, headers, _ = request(app, accept_encoding='gzip',
+                                 if_none_match='"abc-gzip"')
+    assert status == '304 Not Modified'
+    assert header(headers, 'ETag') == '"abc-gzip"'
+
+
+def test_refreshed_entry_takes_new_headers(no_brotli):
+    stub = StubApp(headers=[('Content-Type', 'text/html'),
+                            ('Cache-Control', 'max-age=60'),
+                            ('Expires', 'Thu, 01 Jan 2026 00:00:00 GMT')])
+    app = CompressionMiddleware(stub)
+    _, headers, _ = request(app)
+    etag = header(headers, 'ETag')
+    stub.headers = [('Content-Type', 'text/html'), ('Cache-Control', 'max-age=0')]
+    request(app)
+    status, headers, _ = request(app, if_none_match=etag)
+    assert status == '304 Not Modified'
+    assert header(headers, 'Expires') is None
+    assert stub.calls == 3
+
+
+def test_cache_is_bounded_by_bytes(no_brotli):
+    stub = StubApp(headers=[('Content-Type', 'text/html'),
+                            ('Cache-Control', 'max-age=60')])
+    app = CompressionMiddleware(stub, cache_bytes=3 * len(BODY),
+                                max_entry_bytes=len(BODY))
+    for i in range(5):
+        request(app, path='/%d' % i)
+    assert sum(e.size for e in app._cache.values()) <= 3 * len(BODY)
+    assert list(app._cache) == [('/2', ''), ('/3', ''), ('/4', '')]
+    stub.body = BODY + b'!'
+    request(app, path='/big')
+    assert ('/big', '') not in app._cache
+
+
+def test_head_matches_get_headers(no_brotli):
+    app = CompressionMiddleware(StubApp())
+    _, get_headers, _ = request(app, accept_encoding='gzip')
+    status, head_headers, body = request(app, method='HEAD',
+                                         accept_encoding='gzip')
+    assert status == '200 OK'
+    assert body == b''
+    assert head_headers == get_headers
+
+
+def test_non_200_passes_through(no_brotli):
+    stub = StubApp(status='404 NOT FOUND')
+    app = CompressionMiddleware(stub)
+    status, headers, body = request(app, accept_encoding='gzip')
+    assert status == '404 NOT FOUND'
+    assert header(headers, 'ETag') is None
+    assert body == BODY
+
+
+def test_already_encoded_passes_through(no_brotli):
+    stub = StubApp(headers=[('Content-Type', 'text/html'),
+                            ('Content-Encoding', 'deflate')])
+    app = CompressionMiddleware(stub)
+    _, headers, body = request(app, accept_encoding='gzip')
+    assert header(headers, 'Content-Encoding') == 'deflate'
+    assert header(headers, 'ETag') is None
+    assert body == BODY
+
+
+def test_post_is_never_cached(no_brotli):
+    stub = StubApp(headers=[('Content-Type', 'application/json'),
+                            ('Cache-Control', 'max-age=60')])
+    app = CompressionMiddleware(stub)
+    _, headers, body = request(app, method='POST', accept_encoding='gzip')
+    assert header(headers, 'ETag') is None
+    assert gzip.decompress(body) == BODY
+    status, _, _ = request(app, method='POST', if_none_match='*')
+    assert status == '200 OK'
+    assert stub.calls == 2
+    assert not app._cache